@@ -7,19 +7,26 @@
 # - Alarm Reminder tab (basic)
 # NOTE: Alarm reminder works only when browser tab is open.
 
+import io
 import os
+import html
 import json
+import time
+import functools
 import base64
+import hashlib
+import secrets
+import sqlite3
+import uuid
 from datetime import datetime
 
 import streamlit as st
 import streamlit.components.v1 as components
-import requests
+import httpx
 
-from voice_server.agent_graph import graph
 
-
-USERS_FILE = "users.json"
+USERS_FILE = "users.json"  # legacy store, imported into users.db on first run
+USERS_DB = "users.db"
 
 # IMPORTANT:
 # Use Render deployed voice-server URL in production
@@ -31,23 +38,76 @@ VOICE_PROXY_URL = os.getenv("VOICE_PROXY_URL", "http://127.0.0.1:8765").rstrip("
 # -----------------------
 # Helpers
 # -----------------------
-def load_users():
+def _hash_password(password: str, salt: bytes) -> bytes:
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=2**14, r=8, p=1)
+
+
+def _migrate_json_users(conn):
+    """One-time import of the legacy users.json store (plaintext passwords)."""
     if not os.path.exists(USERS_FILE):
-        return {}
+        return
     try:
         with open(USERS_FILE, "r", encoding="utf-8") as f:
             data = json.load(f)
-            return data if isinstance(data, dict) else {}
     except Exception:
-        return {}
+        return
+    if not isinstance(data, dict):
+        return
+    rows = []
+    for email, rec in data.items():
+        pw = str((rec or {}).get("password", ""))
+        if not pw:
+            continue
+        salt = secrets.token_bytes(16)
+        rows.append((email, _hash_password(pw, salt), salt))
+    # One transaction for the whole import — a single fsync instead of one
+    # per user.
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO users(email, pw_hash, salt) VALUES (?, ?, ?)",
+            rows,
+        )
+
+
+@st.cache_resource
+def get_user_db() -> sqlite3.Connection:
+    conn = sqlite3.connect(USERS_DB, check_same_thread=False)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS users(email TEXT PRIMARY KEY, pw_hash BLOB, salt BLOB)"
+    )
+    _migrate_json_users(conn)
+    return conn
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _get_user_row(email: str):
+    """Cached credential lookup so Streamlit reruns don't re-hit the database."""
+    return get_user_db().execute(
+        "SELECT pw_hash, salt FROM users WHERE email=?", (email,)
+    ).fetchone()
 
 
-def save_users(users):
+def verify_user(email: str, password: str) -> bool:
+    row = _get_user_row(email)
+    if not row:
+        return False
+    pw_hash, salt = row
+    return secrets.compare_digest(_hash_password(password, salt), pw_hash)
+
+
+def create_user(email: str, password: str) -> bool:
+    """Insert a new user row. Returns False if the email is already taken."""
+    conn = get_user_db()
+    salt = secrets.token_bytes(16)
     try:
-        with open(USERS_FILE, "w", encoding="utf-8") as f:
-            json.dump(users, f, indent=2)
+        with conn:
+            conn.execute(
+                "INSERT INTO users(email, pw_hash, salt) VALUES (?, ?, ?)",
+                (email, _hash_password(password, salt), salt),
+            )
+        _get_user_row.clear()
         return True
-    except Exception:
+    except sqlite3.IntegrityError:
         return False
 
 
@@ -76,7 +136,7 @@ if "ui_language" not in st.session_state:
     st.session_state.ui_language = "English"
 
 if "reminders" not in st.session_state:
-    st.session_state.reminders = []  # list of dicts
+    st.session_state.reminders = {}  # reminder id -> dict (stable widget keys)
 
 # -----------------------
 # Page config + Styling
@@ -151,23 +211,153 @@ body {
 # -----------------------
 # LangGraph call (memory from Streamlit)
 # -----------------------
+@st.cache_resource
+def get_graph():
+    """Compiled LangGraph singleton — survives Streamlit script reruns."""
+    from voice_server.agent_graph import graph
+    return graph
+
+
+@st.cache_resource
+def get_http_session() -> httpx.Client:
+    """Shared HTTP client so /vision POSTs reuse the TCP+TLS connection."""
+    return httpx.Client(timeout=30, headers={"Accept-Encoding": "gzip"})
+
+
+# Turns sent verbatim to the model; older turns are folded into a summary.
+HISTORY_WINDOW = 16
+SUMMARY_REFRESH_TURNS = 8
+
+# Hard caps so long-lived sessions keep flat memory.
+MAX_CHAT_HISTORY = 200
+MAX_REMINDERS = 100
+
+# Identical repeated questions are answered from cache for this long.
+ANSWER_CACHE_TTL = 600
+ANSWER_CACHE_MAX = 128
+
+# Trivial inputs that don't deserve a Gemini round trip.
+CANNED_REPLIES = {
+    "hi": "Hello! Ask me a health question.",
+    "hello": "Hello! Ask me a health question.",
+    "hey": "Hello! Ask me a health question.",
+    "thanks": "You're welcome! Ask me anything about your health.",
+    "thank you": "You're welcome! Ask me anything about your health.",
+    "ok": "Okay! Ask me a health question whenever you're ready.",
+    "bye": "Take care! Come back anytime you have a health question.",
+}
+
+
+@functools.lru_cache(maxsize=1024)
+def _canned_reply(q_norm: str):
+    return CANNED_REPLIES.get(q_norm)
+
+
+def _finish_turn(reply: str) -> str:
+    st.session_state.chat_history.append({"role": "assistant", "content": reply})
+    if len(st.session_state.chat_history) > MAX_CHAT_HISTORY:
+        del st.session_state.chat_history[:-MAX_CHAT_HISTORY]
+    return reply
+
+
+def _history_for_graph():
+    """Sliding window over chat history so prompt size stays bounded.
+
+    Turns older than HISTORY_WINDOW are condensed into a rolling summary,
+    refreshed every SUMMARY_REFRESH_TURNS turns and kept in session state.
+    """
+    history = st.session_state.chat_history
+    if len(history) <= HISTORY_WINDOW:
+        return history
+
+    cutoff = len(history) - HISTORY_WINDOW
+    summary = st.session_state.get("history_summary", "")
+    summarized_upto = st.session_state.get("history_summary_upto", 0)
+
+    if not summary or cutoff - summarized_upto >= SUMMARY_REFRESH_TURNS:
+        try:
+            from voice_server.agent_graph import summarize_messages
+
+            summary = summarize_messages(history[:cutoff])
+            st.session_state["history_summary"] = summary
+            st.session_state["history_summary_upto"] = cutoff
+        except Exception:
+            summary = st.session_state.get("history_summary", "")
+
+    window = history[-HISTORY_WINDOW:]
+    if summary:
+        return [{"role": "assistant", "content": f"Summary of earlier conversation: {summary}"}] + window
+    return window
+
+
 def ask_ai(question: str):
     if not question or not question.strip():
         return "Please type your health question."
 
     st.session_state.chat_history.append({"role": "user", "content": question})
 
+    # Cheap front filter: greetings/acks and recently repeated questions are
+    # answered locally without a Gemini round trip.
+    q_norm = " ".join(question.lower().split())
+    canned = _canned_reply(q_norm)
+    if canned is not None:
+        return _finish_turn(canned)
+
+    # Key on (question, preceding assistant turn): follow-ups like "is that
+    # serious?" must not replay an answer produced under different context.
+    prev_assistant = next(
+        (m.get("content", "") for m in reversed(st.session_state.chat_history[:-1]) if m.get("role") == "assistant"),
+        "",
+    )
+    cache_key = (q_norm, prev_assistant)
+
+    answer_cache = st.session_state.setdefault("answer_cache", {})
+    hit = answer_cache.get(cache_key)
+    if hit and time.time() - hit[1] < ANSWER_CACHE_TTL:
+        return _finish_turn(hit[0])
+
+    # Reusable ChatSession, re-seeded from the windowed history once its own
+    # transcript outgrows the window: the SDK keeps history client-side and
+    # re-sends all of it on every send_message, so an unbounded session would
+    # defeat the sliding-window/summary bounding above.
+    chat = st.session_state.get("gemini_chat")
+    if chat is not None and len(getattr(chat, "history", ())) > HISTORY_WINDOW + SUMMARY_REFRESH_TURNS:
+        chat = None
+    if chat is None:
+        try:
+            from voice_server.agent_graph import new_chat
+
+            chat = new_chat(_history_for_graph()[:-1])
+            st.session_state["gemini_chat"] = chat
+        except Exception:
+            chat = None
+
+    # Placeholder that shows tokens as Gemini streams them, instead of waiting
+    # for the full reply before anything appears.
+    stream_box = st.empty()
+
+    def _on_chunk(partial: str):
+        stream_box.markdown(
+            f"<div style='text-align:left; margin:8px'><span class='bubble-bot'><b>HealthExplain:</b> {html.escape(partial)}</span></div>",
+            unsafe_allow_html=True,
+        )
+
     try:
-        result = graph.invoke({"messages": st.session_state.chat_history})
+        result = get_graph().invoke({"messages": _history_for_graph(), "chat": chat, "on_chunk": _on_chunk})
         reply = result.get("reply", "")
     except Exception:
         reply = "Sorry, I am not able to answer right now. Please try again."
+    finally:
+        stream_box.empty()
 
     if not reply:
         reply = "Sorry, I am not able to answer right now. Please try again."
+    elif not reply.startswith("Sorry, I am not able to answer"):
+        answer_cache[cache_key] = (reply, time.time())
+        while len(answer_cache) > ANSWER_CACHE_MAX:
+            answer_cache.pop(next(iter(answer_cache)))
 
-    st.session_state.chat_history.append({"role": "assistant", "content": reply})
-    return reply
+    return _finish_turn(reply)
 
 
 # -----------------------
@@ -184,8 +374,7 @@ def show_login_register():
             login_email = st.text_input("Email or username", key="login_email")
             login_password = st.text_input("Password", type="password", key="login_password")
             if st.form_submit_button("Login"):
-                users = load_users()
-                if login_email in users and users[login_email].get("password") == login_password:
+                if verify_user(login_email, login_password):
                     st.session_state.logged_in = True
                     st.session_state.username = login_email
                     st.success("Logged in")
@@ -208,16 +397,13 @@ def show_login_register():
                     elif reg_pw != reg_confirm:
                         st.error("Passwords do not match")
                     else:
-                        users = load_users()
-                        if reg_email in users:
-                            st.error("User already exists")
-                        else:
-                            users[reg_email] = {"password": reg_pw}
-                            ok = save_users(users)
-                            if ok:
+                        try:
+                            if create_user(reg_email, reg_pw):
                                 st.success("Account created. Please login.")
                             else:
-                                st.error("Error saving account.")
+                                st.error("User already exists")
+                        except Exception:
+                            st.error("Error saving account.")
         st.markdown("</div>", unsafe_allow_html=True)
 
     st.markdown("</div>", unsafe_allow_html=True)
@@ -256,22 +442,25 @@ def chat_page():
 
         c1, c2 = st.columns([0.2, 0.2])
         c1.button("Send", on_click=handle_send)
-        c2.button("Clear chat", on_click=lambda: st.session_state.update({"chat_history": []}))
+        c2.button("Clear chat", on_click=lambda: st.session_state.update({"chat_history": [], "gemini_chat": None, "history_summary": "", "history_summary_upto": 0, "answer_cache": {}}))
 
         st.markdown('<hr class="hr-soft" />', unsafe_allow_html=True)
         st.markdown('<div class="section-title">Chat</div>', unsafe_allow_html=True)
 
+        # One concatenated st.markdown instead of one websocket roundtrip per
+        # bubble; content is escaped since it is untrusted text.
+        bubbles = []
         for m in st.session_state.chat_history[-80:]:
+            content = html.escape(m.get("content", ""))
             if m.get("role") == "user":
-                st.markdown(
-                    f"<div style='text-align:right; margin:8px'><span class='bubble-user'>{m.get('content','')}</span></div>",
-                    unsafe_allow_html=True,
+                bubbles.append(
+                    f"<div style='text-align:right; margin:8px'><span class='bubble-user'>{content}</span></div>"
                 )
             else:
-                st.markdown(
-                    f"<div style='text-align:left; margin:8px'><span class='bubble-bot'><b>HealthExplain:</b> {m.get('content','')}</span></div>",
-                    unsafe_allow_html=True,
+                bubbles.append(
+                    f"<div style='text-align:left; margin:8px'><span class='bubble-bot'><b>HealthExplain:</b> {content}</span></div>"
                 )
+        st.markdown("".join(bubbles), unsafe_allow_html=True)
 
     with right_col:
         # Voice widget shown on the side (as you requested)
@@ -281,6 +470,23 @@ def chat_page():
     st.markdown("</div>", unsafe_allow_html=True)
 
 
+@st.cache_data(show_spinner=False)
+def compress_image(data: bytes) -> bytes:
+    """Downscale to max 1024 px JPEG q=85 before upload.
+
+    Gemini downscales internally anyway, so a raw multi-MB phone photo only
+    wastes bandwidth on the way to the voice server. Cached so reruns don't
+    re-encode the same upload.
+    """
+    from PIL import Image
+
+    im = Image.open(io.BytesIO(data))
+    im.thumbnail((1024, 1024))
+    buf = io.BytesIO()
+    im.convert("RGB").save(buf, "JPEG", quality=85, optimize=True)
+    return buf.getvalue()
+
+
 def ai_doctor_vision_page():
     st.markdown('<div class="card">', unsafe_allow_html=True)
     st.markdown('<div class="title-big" style="font-size:34px;">AI Doctor with Vision and Voice</div>', unsafe_allow_html=True)
@@ -318,8 +524,17 @@ def ai_doctor_vision_page():
             try:
                 url = f"{VOICE_PROXY_URL}/vision"
 
+                try:
+                    payload = compress_image(uploaded.getvalue())
+                    mime = "image/jpeg"
+                except Exception:
+                    payload = uploaded.getvalue()
+                    mime = uploaded.type
+
+                # File-like object so httpx streams the multipart body in
+                # chunks instead of materializing one concatenated payload.
                 files = {
-                    "image": ("image.jpg", uploaded.getvalue(), uploaded.type)
+                    "image": ("image.jpg", io.BytesIO(payload), mime)
                 }
 
                 data = {
@@ -327,7 +542,7 @@ def ai_doctor_vision_page():
                     "lang": lang
                 }
 
-                res = requests.post(url, files=files, data=data)
+                res = get_http_session().post(url, files=files, data=data)
 
                 if res.status_code != 200:
                     response_box.error(f"Vision error: {res.status_code} - {res.text}")
@@ -373,15 +588,17 @@ def alarm_page():
     repeat = st.slider("Repeat times", min_value=1, max_value=20, value=5, key="rem_repeat")
 
     if st.button("Add Reminder"):
-        st.session_state.reminders.append(
-            {
-                "name": name,
-                "msg": msg,
-                "time": time_str.strftime("%H:%M"),
-                "repeat": int(repeat),
-                "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            }
-        )
+        rid = uuid.uuid4().hex
+        st.session_state.reminders[rid] = {
+            "name": name,
+            "msg": msg,
+            "time": time_str.strftime("%H:%M"),
+            "repeat": int(repeat),
+            "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        # Ring-buffer behaviour: drop the oldest reminder past the cap
+        while len(st.session_state.reminders) > MAX_REMINDERS:
+            st.session_state.reminders.pop(next(iter(st.session_state.reminders)))
         st.success("Reminder added ✅")
 
     st.markdown("---")
@@ -390,17 +607,17 @@ def alarm_page():
         st.info("No reminders yet.")
     else:
         st.markdown("### Your Reminders")
-        for idx, r in enumerate(st.session_state.reminders):
+        for rid, r in list(st.session_state.reminders.items()):
             c1, c2 = st.columns([0.8, 0.2])
             with c1:
-                st.write(f"**{r['time']}** → {r['name']} : {r['msg']}  (Repeat: (Repeat: {r['repeat']})")
+                st.write(f"**{r['time']}** → {r['name']} : {r['msg']}  (Repeat: {r['repeat']})")
             with c2:
-                if st.button("Delete", key=f"del_{idx}"):
-                    st.session_state.reminders.pop(idx)
+                if st.button("Delete", key=f"del_{rid}"):
+                    del st.session_state.reminders[rid]
                     safe_rerun()
 
     # Inject alarm JS
-    components.html(build_alarm_js(st.session_state.reminders), height=10)
+    components.html(build_alarm_js(list(st.session_state.reminders.values())), height=10)
 
     st.markdown("</div>", unsafe_allow_html=True)
     # -----------------------
@@ -480,6 +697,7 @@ startTracking();
 # - Supports OLD: POST /voice (JSON -> base64 mp3)
 # - Supports NEW: POST /voice-audio (multipart file -> mp3 download)
 # -----------------------
+@st.cache_data(show_spinner=False)
 def build_voice_widget_html(proxy_url: str) -> str:
     return f"""
 <div style="font-family: Inter, Arial, sans-serif; color: #e6eef6;">
@@ -531,6 +749,9 @@ def build_voice_widget_html(proxy_url: str) -> str:
   const proxyBase = "{proxy_url}";
   const LOG = (m)=>{{ try{{ console.log("[voice-assistant]", m); }}catch(e){{}} }};
 
+  // Static label -> BCP-47 lookup (O(1) property read in the mic handler)
+  const LANG_MAP = {{English:'en-US', Hindi:'hi-IN', Telugu:'te-IN', Tamil:'ta-IN', Gujarati:'gu-IN'}};
+
   const SpeechRecognition = window.SpeechRecognition || window.webkitSpeechRecognition;
 
   function escapeHtml(s){{
@@ -603,6 +824,58 @@ def build_voice_widget_html(proxy_url: str) -> str:
     }});
   }}
 
+  // Stream mic audio over the WebSocket in 250 ms chunks; recording stops on
+  // ~600 ms of silence (RMS) instead of a fixed 4 s buffer.
+  async function streamAudioUtterance(lang){{
+    const sock = await ensureWs();
+    sock.send(JSON.stringify({{type: 'config', lang: lang}}));
+
+    const stream = await navigator.mediaDevices.getUserMedia({{ audio: true }});
+    const mediaRecorder = new MediaRecorder(stream);
+
+    const ctx = new (window.AudioContext || window.webkitAudioContext)();
+    const analyser = ctx.createAnalyser();
+    analyser.fftSize = 512;
+    ctx.createMediaStreamSource(stream).connect(analyser);
+    const samples = new Float32Array(analyser.fftSize);
+    let lastVoice = Date.now();
+    let spoke = false;  // silence-stop only arms after voice is first heard
+
+    return new Promise((resolve) => {{
+      function stopRecording(){{
+        clearTimeout(maxTimer);
+        clearInterval(vadTimer);
+        try {{ mediaRecorder.stop(); }} catch(e) {{}}
+      }}
+
+      const maxTimer = setTimeout(stopRecording, 10000); // hard safety cap
+      const vadTimer = setInterval(() => {{
+        analyser.getFloatTimeDomainData(samples);
+        let sum = 0;
+        for(let i = 0; i < samples.length; i++) sum += samples[i] * samples[i];
+        const rms = Math.sqrt(sum / samples.length);
+        if(rms > 0.015) {{ spoke = true; lastVoice = Date.now(); }}
+        else if(spoke && Date.now() - lastVoice > 600) stopRecording();
+      }}, 100);
+
+      mediaRecorder.ondataavailable = (e) => {{
+        if(e.data && e.data.size > 0 && sock.readyState === WebSocket.OPEN) sock.send(e.data);
+      }};
+
+      mediaRecorder.onstop = () => {{
+        try {{ stream.getTracks().forEach(t => t.stop()); }} catch(e) {{}}
+        try {{ ctx.close(); }} catch(e) {{}}
+        // let the final chunk flush before the end marker
+        setTimeout(() => {{
+          try {{ sock.send(JSON.stringify({{type: 'end'}})); }} catch(e) {{}}
+          resolve();
+        }}, 0);
+      }};
+
+      mediaRecorder.start(250);
+    }});
+  }}
+
   async function callVoiceAudioEndpoint(audioBlob){{
     try {{
       const form = new FormData();
@@ -626,7 +899,44 @@ def build_voice_widget_html(proxy_url: str) -> str:
   }}
 
   // -----------------------------
-  // OLD: text -> /voice -> reply+base64
+  // NEW: persistent WebSocket transport (one handshake per widget,
+  // token/audio deltas pushed as they arrive)
+  // -----------------------------
+  let ws = null;
+  let wsReady = null;
+
+  function handleWsMessage(ev){{
+    try {{
+      const d = JSON.parse(ev.data);
+      if(d.type === 'partial'){{
+        appendLog('user', d.text || '');
+      }} else if(d.type === 'final'){{
+        appendLog('assistant', d.text || '(no reply)');
+      }} else if(d.type === 'audio'){{
+        playAudioBase64Mp3(d.b64);
+      }} else if(d.type === 'error'){{
+        appendLog('assistant', d.text || 'Voice server error.');
+      }}
+    }} catch(e) {{ LOG('ws message parse failed ' + e); }}
+  }}
+
+  function ensureWs(){{
+    if(ws && ws.readyState === WebSocket.OPEN) return Promise.resolve(ws);
+    if(wsReady) return wsReady;
+    wsReady = new Promise((resolve, reject) => {{
+      try {{
+        const sock = new WebSocket(proxyBase.replace(/^http/, 'ws') + '/ws');
+        sock.onopen = () => {{ ws = sock; resolve(sock); }};
+        sock.onerror = (e) => {{ wsReady = null; reject(e); }};
+        sock.onclose = () => {{ ws = null; wsReady = null; }};
+        sock.onmessage = handleWsMessage;
+      }} catch(e) {{ wsReady = null; reject(e); }}
+    }});
+    return wsReady;
+  }}
+
+  // -----------------------------
+  // OLD: text -> /voice -> reply+base64 (fallback when WS unavailable)
   // -----------------------------
   async function callVoiceTextEndpoint(text, lang){{
     try {{
@@ -652,7 +962,17 @@ def build_voice_widget_html(proxy_url: str) -> str:
     if(!text) return;
     appendLog('user', text);
 
-    // Try OLD endpoint first (keeps backward compatibility)
+    // Prefer the persistent WebSocket; deltas arrive via handleWsMessage
+    try {{
+      const sock = await ensureWs();
+      sock.send(JSON.stringify({{type: 'config', lang: lang}}));
+      sock.send(JSON.stringify({{type: 'text', text: text}}));
+      return;
+    }} catch(e) {{
+      LOG('ws unavailable, falling back to POST: ' + e);
+    }}
+
+    // Fallback: OLD endpoint (keeps backward compatibility)
     const res1 = await callVoiceTextEndpoint(text, lang);
 
     if(res1.ok && res1.data){{
@@ -693,12 +1013,7 @@ def build_voice_widget_html(proxy_url: str) -> str:
         recog.maxAlternatives = 1;
 
         const lang = langSel.value || 'English';
-        recog.lang =
-          (lang === 'Hindi') ? 'hi-IN' :
-          (lang === 'Telugu') ? 'te-IN' :
-          (lang === 'Tamil') ? 'ta-IN' :
-          (lang === 'Gujarati') ? 'gu-IN' :
-          'en-US';
+        recog.lang = LANG_MAP[lang] || 'en-US';
 
         recog.onresult = async (ev) => {{
           const text = ev.results[0][0].transcript;
@@ -726,24 +1041,29 @@ def build_voice_widget_html(proxy_url: str) -> str:
         }}
 
       }} else {{
-        // If SpeechRecognition not supported, fallback to audio recording
+        // If SpeechRecognition not supported, stream mic audio over the
+        // WebSocket; POST the whole recording only if the socket fails
+        const lang = langSel.value || 'English';
         try {{
-          const lang = langSel.value || 'English';
-          appendLog('assistant', "Speech Recognition not supported. Using audio mode...");
-
-          const audioBlob = await recordAudioOnce();
-          const res = await callVoiceAudioEndpoint(audioBlob);
-
-          if(res.ok && res.blob){{
-            appendLog('assistant', "Playing reply audio...");
-            await playAudioFromBlob(res.blob);
-          }} else {{
-            appendLog('assistant', "Audio mode failed.");
-            LOG("voice-audio error: " + (res.error || "unknown"));
-          }}
+          setStatus('Listening (audio mode)...');
+          await streamAudioUtterance(lang);
         }} catch(e) {{
-          appendLog('assistant', "Audio recording failed.");
-          LOG("audio record error: " + e);
+          LOG('ws audio mode failed, falling back to POST: ' + e);
+          try {{
+            const audioBlob = await recordAudioOnce();
+            const res = await callVoiceAudioEndpoint(audioBlob);
+
+            if(res.ok && res.blob){{
+              appendLog('assistant', "Playing reply audio...");
+              await playAudioFromBlob(res.blob);
+            }} else {{
+              appendLog('assistant', "Audio mode failed.");
+              LOG("voice-audio error: " + (res.error || "unknown"));
+            }}
+          }} catch(e2) {{
+            appendLog('assistant', "Audio recording failed.");
+            LOG("audio record error: " + e2);
+          }}
         }}
 
         isListening = false;
@@ -771,6 +1091,7 @@ def build_voice_widget_html(proxy_url: str) -> str:
 # -----------------------
 # Alarm JS
 # -----------------------
+@st.cache_data(show_spinner=False)
 def build_alarm_js(reminders):
     # send reminders safely as JSON string
     rem_json = json.dumps(reminders)
@@ -780,35 +1101,36 @@ def build_alarm_js(reminders):
 (function(){{
   const reminders = {rem_json};
 
+  // Pre-parse "HH:MM" once into minutes-since-midnight for an integer compare
+  reminders.forEach(r => {{
+    const parts = String(r.time || "").split(":");
+    r._min = (+parts[0]) * 60 + (+parts[1]);
+  }});
+
   function speakText(text, repeat){{
     try {{
       window.speechSynthesis.cancel();
       let count = 0;
 
-      function speakOnce(){{
-        if(count >= repeat) return;
-        const u = new SpeechSynthesisUtterance(text);
-        u.rate = 1.0;
-        u.pitch = 1.0;
-        u.onend = () => {{
-          count++;
-          if(count < repeat) speakOnce();
-        }};
-        window.speechSynthesis.speak(u);
-      }}
+      // Build the utterance once and requeue it, instead of allocating a
+      // new one per repeat
+      const u = new SpeechSynthesisUtterance(text);
+      u.rate = 1.0;
+      u.pitch = 1.0;
+      u.onend = () => {{
+        if(++count < repeat) window.speechSynthesis.speak(u);
+      }};
 
-      speakOnce();
+      window.speechSynthesis.speak(u);
     }} catch(e) {{}}
   }}
 
   function checkAlarm(){{
     const now = new Date();
-    const hh = String(now.getHours()).padStart(2,'0');
-    const mm = String(now.getMinutes()).padStart(2,'0');
-    const current = hh + ":" + mm;
+    const nowMin = now.getHours() * 60 + now.getMinutes();
 
     reminders.forEach(r => {{
-      if(r.time === current){{
+      if(r._min === nowMin){{
         const text = (r.name || "Reminder") + ", " + (r.msg || "Please take medicine");
         const repeat = parseInt(r.repeat || 5);
         speakText(text, repeat);
@@ -816,7 +1138,14 @@ def build_alarm_js(reminders):
     }});
   }}
 
-  setInterval(checkAlarm, 1000 * 10);
+  // Wake exactly once per minute boundary instead of polling every 10 s
+  function schedule(){{
+    const d = new Date();
+    const ms = 60000 - (d.getSeconds() * 1000 + d.getMilliseconds());
+    setTimeout(() => {{ checkAlarm(); schedule(); }}, ms);
+  }}
+
+  schedule();
 }})();
 </script>
 """
@@ -855,7 +1184,7 @@ with left:
     st.markdown("</div>", unsafe_allow_html=True)
 
     if st.button("Logout"):
-        st.session_state.update({"logged_in": False, "username": "", "chat_history": [], "reminders": []})
+        st.session_state.update({"logged_in": False, "username": "", "chat_history": [], "reminders": {}, "gemini_chat": None, "history_summary": "", "history_summary_upto": 0, "answer_cache": {}})
         safe_rerun()
 
 with main:
@@ -3,7 +3,7 @@
 # Memory handled in Streamlit/voice_proxy (frontend)
 
 import os
-import base64
+from functools import lru_cache
 from typing import TypedDict, List, Dict, Optional
 
 import google.generativeai as genai
@@ -24,6 +24,12 @@ TEXT_MODEL = os.getenv("GEMINI_TEXT_MODEL", "gemini-2.5-flash")
 VISION_MODEL = os.getenv("GEMINI_VISION_MODEL", "gemini-2.5-flash")
 
 
+@lru_cache(maxsize=4)
+def _get_model(model_name: str) -> genai.GenerativeModel:
+    """Reuse one GenerativeModel per model name (construction is per-call overhead)."""
+    return genai.GenerativeModel(model_name)
+
+
 # -------------------------
 # Graph State
 # -------------------------
@@ -31,6 +37,9 @@ class AgentState(TypedDict, total=False):
     messages: List[Dict[str, str]]
     reply: str
     image_bytes: Optional[bytes]   # for vision
+    image_mime: Optional[str]      # e.g. "image/png" (defaults to JPEG)
+    on_chunk: Optional[object]     # callable(partial_text) for streaming UIs
+    chat: Optional[object]         # genai ChatSession reused across turns
 
 
 # -------------------------
@@ -51,49 +60,113 @@ STRICT RULES:
 """
 
 
-def build_prompt(messages: List[Dict[str, str]]) -> str:
-    chat_text = ""
+# System prompt as the opening exchange of a Gemini roles list
+_SYSTEM_SEED = [
+    {"role": "user", "parts": [SYSTEM_PROMPT]},
+    {"role": "model", "parts": ["Understood. I will follow these rules."]},
+]
+
+
+def _to_gemini_history(messages: List[Dict[str, str]]) -> List[Dict[str, object]]:
+    """Convert Streamlit chat messages to the Gemini roles-list format."""
+    history = []
     for m in messages:
-        role = m.get("role", "")
-        content = m.get("content", "")
-        if role == "user":
-            chat_text += f"User: {content}\n"
-        else:
-            chat_text += f"Assistant: {content}\n"
+        role = "user" if m.get("role") == "user" else "model"
+        history.append({"role": role, "parts": [m.get("content", "")]})
+    return history
+
+
+def new_chat(messages: Optional[List[Dict[str, str]]] = None):
+    """Start a reusable ChatSession seeded with the system prompt + prior turns.
+
+    Note the SDK keeps the transcript client-side and re-sends it on every
+    send_message, so callers should seed from a windowed history and re-seed
+    periodically (see app.ask_ai) to keep prompt size bounded.
+    """
+    history = list(_SYSTEM_SEED)
+    if messages:
+        history.extend(_to_gemini_history(messages))
+    return _get_model(TEXT_MODEL).start_chat(history=history)
+
+
+def summarize_messages(messages: List[Dict[str, str]]) -> str:
+    """Condense old turns into a short rolling summary with one cheap call."""
+    if not messages:
+        return ""
+    chat_text = "\n".join(
+        f"{'User' if m.get('role') == 'user' else 'Assistant'}: {m.get('content', '')}"
+        for m in messages
+    )
+    resp = _get_model(TEXT_MODEL).generate_content(
+        "Summarize this health-assistant conversation in 3-4 short lines, "
+        "keeping symptoms, advice given, and open questions:\n\n" + chat_text
+    )
+    return (resp.text or "").strip()
+
 
+def build_prompt(messages: List[Dict[str, str]]) -> str:
+    chat_text = "\n".join(
+        f"{'User' if m.get('role') == 'user' else 'Assistant'}: {m.get('content', '')}"
+        for m in messages
+    )
     return f"{SYSTEM_PROMPT}\n\nConversation:\n{chat_text}\nAssistant:"
 
 
+def _collect_stream(resp, on_chunk) -> str:
+    """Accumulate a streaming response, pushing partial text to on_chunk (if given)."""
+    parts = []
+    for chunk in resp:
+        piece = getattr(chunk, "text", "") or ""
+        if not piece:
+            continue
+        parts.append(piece)
+        if on_chunk:
+            try:
+                on_chunk("".join(parts))
+            except Exception:
+                pass
+    return "".join(parts).strip()
+
+
 def agent_node(state: AgentState) -> AgentState:
     messages = state.get("messages", [])
     image_bytes = state.get("image_bytes", None)
-
-    prompt = build_prompt(messages)
+    on_chunk = state.get("on_chunk", None)
+    chat = state.get("chat", None)
 
     try:
-        # -------- VISION MODE --------
-        if image_bytes:
-            model = genai.GenerativeModel(VISION_MODEL)
+        # -------- CHAT MODE (session keeps server-side context) --------
+        if chat is not None and not image_bytes:
+            user_text = messages[-1].get("content", "") if messages else ""
+            resp = chat.send_message(user_text, stream=True)
+            text = _collect_stream(resp, on_chunk)
 
-            img_b64 = base64.b64encode(image_bytes).decode("utf-8")
+        # -------- VISION MODE --------
+        elif image_bytes:
+            prompt = build_prompt(messages)
+            model = _get_model(VISION_MODEL)
 
+            # SDK accepts raw bytes and encodes internally — no manual base64 copy
             resp = model.generate_content([
                 prompt,
                 {
                     "inline_data": {
-                        "mime_type": "image/jpeg",
-                        "data": img_b64
+                        "mime_type": state.get("image_mime") or "image/jpeg",
+                        "data": image_bytes
                     }
                 }
-            ])
+            ], stream=True)
 
-            text = (resp.text or "").strip()
+            text = _collect_stream(resp, on_chunk)
 
-        # -------- TEXT MODE --------
+        # -------- TEXT MODE (no session supplied) --------
         else:
-            model = genai.GenerativeModel(TEXT_MODEL)
-            resp = model.generate_content(prompt)
-            text = (resp.text or "").strip()
+            model = _get_model(TEXT_MODEL)
+            # Structured roles list: no prompt-string synthesis, and Gemini
+            # can apply its own context caching
+            contents = _SYSTEM_SEED + _to_gemini_history(messages)
+            resp = model.generate_content(contents, stream=True)
+            text = _collect_stream(resp, on_chunk)
 
     except Exception as e:
         text = f"Sorry, I am not able to answer right now. Please try again. ({e})"
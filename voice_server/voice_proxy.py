@@ -8,27 +8,46 @@
 #  - GET  /health
 #
 # Run local:
-#   uvicorn voice_proxy:app --host 127.0.0.1 --port 8765
+#   python voice_proxy.py
+# (sizes workers to 2*cpu+1 and uses uvloop+httptools; override with
+#  WEB_CONCURRENCY / PORT. Plain `uvicorn voice_proxy:app` still works.)
 
 import os
 import re
 import io
-import time
+import json
 import base64
+import asyncio
+import hashlib
 import logging
+import itertools
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Tuple
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+import httpx
+import orjson
+from fastapi import FastAPI, HTTPException, Response, UploadFile, File, Form, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from urllib.parse import quote
+from functools import cache
 from gtts import gTTS
+from pydantic import BaseModel
 
-# ✅ Gemini NEW SDK
-from google import genai
+# SIMD base64 (SSSE3/AVX2) — 4-10x faster on the ~50-200 KB MP3 payloads
+try:
+    import pybase64 as _b64
+except ImportError:
+    _b64 = base64
 
 logger = logging.getLogger("voice-proxy")
 logging.basicConfig(level=logging.INFO)
 
-app = FastAPI(title="voice-proxy-gemini-multilingual-tts")
+# orjson serializes the large base64 audio strings in C — 2-5x faster than
+# the stdlib encoder on the /voice payloads.
+app = FastAPI(title="voice-proxy-gemini-multilingual-tts", default_response_class=ORJSONResponse)
 
 # -------------------------
 # CORS (Streamlit / Website / Any)
@@ -44,16 +63,71 @@ app.add_middleware(
 # -------------------------
 # Gemini setup
 # -------------------------
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "").strip()
-if not GEMINI_API_KEY:
-    raise RuntimeError("❌ Missing GEMINI_API_KEY environment variable.")
-
 # ✅ Your requested model
 # ⚠️ gemini-2.5-flash sometimes overloaded, so we keep fallback too
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
 FALLBACK_MODEL = os.getenv("GEMINI_FALLBACK_MODEL", "gemini-1.5-flash")
 
-client = genai.Client(api_key=GEMINI_API_KEY)
+
+@cache
+def _get_client():
+    """Build the Gemini client once, on first use.
+
+    The SDK import and key check are deferred so importing this module (or
+    hitting /health) stays cheap and works without a key configured.
+    """
+    api_key = os.getenv("GEMINI_API_KEY", "").strip()
+    if not api_key:
+        raise RuntimeError("❌ Missing GEMINI_API_KEY environment variable.")
+
+    # ✅ Gemini NEW SDK
+    from google import genai
+
+    return genai.Client(api_key=api_key)
+
+# Cap in-flight Gemini calls so upstream rate limits surface as brief queuing
+# here instead of retry storms.
+_GEMINI_SEM = asyncio.Semaphore(int(os.getenv("GEMINI_CONCURRENCY", "8")))
+
+
+@app.on_event("startup")
+async def _set_executor():
+    """Bound the threadpool that absorbs blocking work (STT, graph.invoke)."""
+    workers = int(os.getenv("WORKER_THREADS", str(2 * (os.cpu_count() or 4))))
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=workers))
+
+
+@app.on_event("shutdown")
+async def _close_httpx():
+    await _HTTPX.aclose()
+
+
+@app.on_event("startup")
+async def _start_batch_worker():
+    global _batch_queue, _batch_worker_task
+    _batch_queue = asyncio.Queue()
+    # keep a reference: a bare create_task can be garbage-collected mid-flight
+    _batch_worker_task = asyncio.create_task(_batch_worker())
+
+
+@app.on_event("startup")
+async def _prewarm_tts_cache():
+    """Synthesize the busy-fallback phrase per language before first traffic."""
+    langs = ("en", "hi", "te", "ta", "gu")
+
+    async def _prewarm():
+        results = await asyncio.gather(
+            *(tts_synthesize_mp3_gtts(FALLBACK_REPLY, lang=lang) for lang in langs),
+            return_exceptions=True,
+        )
+        for lang, res in zip(langs, results):
+            if isinstance(res, Exception):
+                logger.warning(f"[prewarm] TTS for {lang} failed: {res}")
+
+    # supervised + referenced: a bare create_task can be GC'd mid-flight
+    task = asyncio.create_task(_prewarm())
+    _fallback_tasks.add(task)
+    task.add_done_callback(_fallback_tasks.discard)
 
 SYSTEM_INSTRUCTION = (
     "You are a medical assistant. "
@@ -63,6 +137,8 @@ SYSTEM_INSTRUCTION = (
     "If emergency symptoms, suggest doctor visit."
 )
 
+FALLBACK_REPLY = "Sorry, AI is busy right now. Please try again in 10 seconds."
+
 STOP_COMMANDS = {
     "en": ["stop", "stop speaking", "ok stop", "stop now", "please stop", "that's enough"],
     "hi": ["रुको", "बोलना बंद करो", "रुकिए", "बंद करो"],
@@ -74,59 +150,76 @@ STOP_COMMANDS = {
 # -------------------------
 # Helpers
 # -------------------------
+_SENT_END_RE = re.compile(r"[.!?]\s+")
+
+
 def shorten_text_to_sentences(text: str, max_sentences: int = 2) -> str:
     """Keep answer short for better TTS + UI."""
     if not text:
         return ""
-    t = re.sub(r"\s+", " ", text).strip()
+    # str.split/join is C-implemented and beats re.sub for plain whitespace
+    t = " ".join(text.split())
     if not t:
         return ""
 
-    sents = re.split(r"(?<=[.!?])\s+", t)
-    if len(sents) >= max_sentences:
-        return " ".join(sents[:max_sentences]).strip()
+    # Stop scanning after max_sentences boundaries regardless of text length
+    ends = list(itertools.islice(_SENT_END_RE.finditer(t), max_sentences))
+    if len(ends) >= max_sentences:
+        return t[: ends[max_sentences - 1].start() + 1].rstrip()
+    if ends and len(ends) == max_sentences - 1:
+        # exactly max_sentences sentences — keep them all
+        return t
 
     return t if len(t) <= 350 else t[:347].rsplit(" ", 1)[0] + "..."
 
 
+# Lookup tables hoisted to module scope — the old function bodies rebuilt
+# these dict literals on every call.
+_LANG_CODES = {
+    "English": "en",
+    "Hindi": "hi",
+    "Telugu": "te",
+    "Tamil": "ta",
+    "Gujarati": "gu",
+    "en": "en",
+    "hi": "hi",
+    "te": "te",
+    "ta": "ta",
+    "gu": "gu",
+}
+
+_GTTS_LANGS = {
+    "English": "en",
+    "Hindi": "hi",
+    "Telugu": "te",
+    "Tamil": "ta",
+    "Gujarati": "gu",
+}
+
+
 def LANG_CODE_FROM_LABEL(label: str) -> str:
     """Frontend label -> language code"""
     if not label:
         return "en"
-    lookup = {
-        "English": "en",
-        "Hindi": "hi",
-        "Telugu": "te",
-        "Tamil": "ta",
-        "Gujarati": "gu",
-        "en": "en",
-        "hi": "hi",
-        "te": "te",
-        "ta": "ta",
-        "gu": "gu",
-    }
-    return lookup.get(str(label).strip(), "en")
+    return _LANG_CODES.get(str(label).strip(), "en")
 
 
 def GTTS_LANG_FROM_LABEL(label: str) -> str:
     """Frontend label -> gTTS language code"""
-    cfg = {
-        "English": "en",
-        "Hindi": "hi",
-        "Telugu": "te",
-        "Tamil": "ta",
-        "Gujarati": "gu",
-    }
-    return cfg.get(str(label).strip(), "en")
+    return _GTTS_LANGS.get(str(label).strip(), "en")
+
+
+# Lowercased frozensets built once: the per-request check is a hash probe
+# instead of a rebuilt list scan.
+_STOP_SETS = {code: frozenset(s.lower() for s in lst) for code, lst in STOP_COMMANDS.items()}
+_EMPTY_STOP_SET: frozenset = frozenset()
 
 
 def detect_stop_phrase(text: str, lang_label: str) -> bool:
     if not text:
         return False
-    lang_code = LANG_CODE_FROM_LABEL(lang_label)
-    stop_list = STOP_COMMANDS.get(lang_code, [])
-    txt = text.strip().lower()
-    return txt in [s.lower() for s in stop_list]
+    stop_set = _STOP_SETS.get(LANG_CODE_FROM_LABEL(lang_label), _EMPTY_STOP_SET)
+    return text.strip().lower() in stop_set
 
 
 def language_instruction_from_code(lang_code: str) -> str:
@@ -142,6 +235,14 @@ def language_instruction_from_code(lang_code: str) -> str:
 # -------------------------
 # Gemini generation (with retry + fallback model)
 # -------------------------
+# Per-language prompt prefixes baked once at import; per request only the
+# user text is concatenated on.
+_PROMPT_PREFIXES = {
+    code: f"{SYSTEM_INSTRUCTION}\n{language_instruction_from_code(code)}\n\nUser question: "
+    for code in ("en", "hi", "te", "ta", "gu")
+}
+
+
 async def call_gemini_generate(user_text: str, lang_label: str = "English") -> Tuple[int, str]:
     """
     Calls Gemini and returns (status_code, reply_text)
@@ -150,21 +251,17 @@ async def call_gemini_generate(user_text: str, lang_label: str = "English") -> T
     """
     lang_code = LANG_CODE_FROM_LABEL(lang_label)
 
-    prompt = (
-        f"{SYSTEM_INSTRUCTION}\n"
-        f"{language_instruction_from_code(lang_code)}\n\n"
-        f"User question: {user_text}\n\n"
-        f"Answer:"
-    )
+    prompt = _PROMPT_PREFIXES.get(lang_code, _PROMPT_PREFIXES["en"]) + user_text + "\n\nAnswer:"
 
-    # 1) Try main model with retries
+    # 1) Try main model with retries (async SDK + non-blocking backoff)
     last_error = ""
     for attempt in range(3):
         try:
-            resp = client.models.generate_content(
-                model=GEMINI_MODEL,
-                contents=prompt,
-            )
+            async with _GEMINI_SEM:
+                resp = await _get_client().aio.models.generate_content(
+                    model=GEMINI_MODEL,
+                    contents=prompt,
+                )
             text = (resp.text or "").strip()
             if text:
                 return 200, text
@@ -172,15 +269,16 @@ async def call_gemini_generate(user_text: str, lang_label: str = "English") -> T
         except Exception as e:
             last_error = str(e)
             logger.warning(f"[Gemini main model failed] attempt={attempt+1} error={last_error}")
-            time.sleep(2)
+            await asyncio.sleep(2 * (attempt + 1))
 
     # 2) Fallback model (more stable)
     for attempt in range(2):
         try:
-            resp = client.models.generate_content(
-                model=FALLBACK_MODEL,
-                contents=prompt,
-            )
+            async with _GEMINI_SEM:
+                resp = await _get_client().aio.models.generate_content(
+                    model=FALLBACK_MODEL,
+                    contents=prompt,
+                )
             text = (resp.text or "").strip()
             if text:
                 return 200, text
@@ -188,29 +286,261 @@ async def call_gemini_generate(user_text: str, lang_label: str = "English") -> T
         except Exception as e:
             last_error = str(e)
             logger.warning(f"[Gemini fallback failed] attempt={attempt+1} error={last_error}")
-            time.sleep(2)
+            await asyncio.sleep(2 * (attempt + 1))
 
     return 500, last_error
 
 
 # -------------------------
-# gTTS audio (FREE)
+# Micro-batching (coalesce concurrent Gemini calls)
+# -------------------------
+# Per-call latency dominates for 2-sentence replies, so a ~20 ms coalescing
+# window trades negligible added latency for one API call per batch.
+_BATCH_WINDOW = float(os.getenv("GEMINI_BATCH_WINDOW", "0.02"))
+_BATCH_MAX = int(os.getenv("GEMINI_BATCH_MAX", "8"))
+
+_batch_queue: Optional[asyncio.Queue] = None
+_batch_worker_task: Optional[asyncio.Task] = None
+
+# Spawned fallback tasks need a live reference or the loop may GC them
+_fallback_tasks: set = set()
+
+_BATCH_ANSWER_RE = re.compile(r"(?m)^\s*A(\d+)\s*:\s*")
+
+
+def _resolve(fut: asyncio.Future, result) -> None:
+    """set_result that tolerates futures cancelled by disconnected callers."""
+    if fut.done():
+        return
+    try:
+        fut.set_result(result)
+    except asyncio.InvalidStateError:
+        pass
+
+
+def _answer_individually(text: str, lang_label: str, fut: asyncio.Future) -> None:
+    """Answer one item in its own task so slow retries never stall the worker."""
+
+    async def _run():
+        _resolve(fut, await call_gemini_generate(text, lang_label=lang_label))
+
+    task = asyncio.create_task(_run())
+    _fallback_tasks.add(task)
+    task.add_done_callback(_fallback_tasks.discard)
+
+
+def _split_batch_answers(raw: str, n: int):
+    """Parse 'A1: ... / A2: ...' formatted output back into n answers."""
+    parts = _BATCH_ANSWER_RE.split(raw)
+    answers = {}
+    for i in range(1, len(parts) - 1, 2):
+        try:
+            idx = int(parts[i])
+        except ValueError:
+            continue
+        answers[idx] = parts[i + 1].strip()
+    return [answers.get(i + 1, "") for i in range(n)]
+
+
+async def _answer_batch(batch):
+    """One generate_content call for several pending (text, lang) questions."""
+    lines = [
+        SYSTEM_INSTRUCTION,
+        "Answer each numbered question separately. "
+        "Format strictly as 'A1: ...', 'A2: ...' with each answer on its own line.",
+    ]
+    for i, (text, lang_label, _) in enumerate(batch, 1):
+        lang_code = LANG_CODE_FROM_LABEL(lang_label)
+        lines.append(f"Q{i} ({language_instruction_from_code(lang_code)}): {text}")
+
+    answers = []
+    try:
+        async with _GEMINI_SEM:
+            resp = await _get_client().aio.models.generate_content(
+                model=GEMINI_MODEL,
+                contents="\n".join(lines),
+            )
+        answers = _split_batch_answers((resp.text or "").strip(), len(batch))
+    except Exception as e:
+        logger.warning(f"[batch] combined call failed, answering individually: {e}")
+
+    # Anything the combined call missed falls back to an individual call,
+    # spawned off-worker so retry backoff can't block later batches.
+    for (text, lang_label, fut), answer in zip(
+        batch, answers or [""] * len(batch)
+    ):
+        if fut.done():
+            continue
+        if answer:
+            _resolve(fut, (200, answer))
+        else:
+            _answer_individually(text, lang_label, fut)
+
+
+async def _batch_worker():
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await _batch_queue.get()]
+        deadline = loop.time() + _BATCH_WINDOW
+        while len(batch) < _BATCH_MAX:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(_batch_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        # The worker must outlive any single bad batch: resolve what we can
+        # and keep looping, otherwise every later request hangs on its future.
+        try:
+            if len(batch) == 1:
+                text, lang_label, fut = batch[0]
+                if not fut.done():
+                    _answer_individually(text, lang_label, fut)
+            else:
+                await _answer_batch(batch)
+        except Exception as e:
+            logger.exception("[batch] worker iteration failed")
+            for _, _, fut in batch:
+                _resolve(fut, (500, str(e)))
+
+
+async def generate_reply(user_text: str, lang_label: str = "English") -> Tuple[int, str]:
+    """Entry point for the voice handlers: coalesces concurrent requests."""
+    if _batch_queue is None:
+        return await call_gemini_generate(user_text, lang_label=lang_label)
+
+    fut = asyncio.get_running_loop().create_future()
+    _batch_queue.put_nowait((user_text, lang_label, fut))
+    return await fut
+
+
+# -------------------------
+# gTTS audio (FREE, async)
 # -------------------------
+# Shared async client: keep-alive amortizes the TLS handshake to Google
+# across requests instead of paying it per call.
+_HTTPX = httpx.AsyncClient(
+    timeout=10,
+    limits=httpx.Limits(max_keepalive_connections=32),
+)
+
+_TTS_URL = "https://translate.google.com/translate_tts"
+_TTS_MAX_CHARS = 100  # Google TTS per-request character cap (same as gTTS)
+
+
+def _split_tts_text(text: str, max_chars: int = _TTS_MAX_CHARS):
+    """Split text into <= max_chars chunks at word boundaries."""
+    chunks = []
+    cur = ""
+    for word in text.split():
+        if cur and len(cur) + 1 + len(word) > max_chars:
+            chunks.append(cur)
+            cur = word
+        else:
+            cur = f"{cur} {word}" if cur else word
+    if cur:
+        chunks.append(cur)
+    return chunks
+
+
+def _gtts_sync_mp3(text: str, lang: str) -> bytes:
+    """Blocking gTTS synthesis — only used as fallback, via the threadpool."""
+    mp3_fp = io.BytesIO()
+    gTTS(text=text, lang=lang).write_to_fp(mp3_fp)
+    # getvalue() returns the buffer contents without the seek+read copy
+    return mp3_fp.getvalue()
+
+
+# Preferred engine: Edge neural TTS streams the whole MP3 over one WebSocket
+# instead of N sequential translate_tts GETs — 3-5x lower synthesis latency.
+_EDGE_VOICES = {
+    "en": "en-US-AriaNeural",
+    "hi": "hi-IN-SwaraNeural",
+    "te": "te-IN-ShrutiNeural",
+    "ta": "ta-IN-PallaviNeural",
+    "gu": "gu-IN-DhwaniNeural",
+}
+
+
+async def _edge_tts_mp3(text: str, lang: str) -> bytes:
+    import edge_tts
+
+    communicate = edge_tts.Communicate(text, voice=_EDGE_VOICES.get(lang, _EDGE_VOICES["en"]))
+    buf = bytearray()
+    async for chunk in communicate.stream():
+        if chunk["type"] == "audio":
+            buf.extend(chunk["data"])
+    if not buf:
+        raise RuntimeError("edge-tts returned no audio")
+    return bytes(buf)
+
+
+# Bounded in-memory LRU: repeated phrases (stop/fallback/greetings) become a
+# dict lookup instead of a synthesis round trip.
+_TTS_CACHE: "OrderedDict[str, str]" = OrderedDict()
+_TTS_CACHE_MAX = 512
+
+
 async def tts_synthesize_mp3_gtts(text: str, lang: str = "en") -> Tuple[int, Optional[str]]:
+    """Cached front for TTS: repeated (text, lang) pairs skip synthesis."""
+    if not text or not text.strip():
+        return 200, None
+
+    key = hashlib.sha1(f"{lang}|{text}".encode("utf-8")).hexdigest()
+    cached = _TTS_CACHE.get(key)
+    if cached is not None:
+        _TTS_CACHE.move_to_end(key)
+        return 200, cached
+
+    status, audio_b64 = await _tts_synthesize_mp3(text, lang)
+    if status == 200 and audio_b64:
+        _TTS_CACHE[key] = audio_b64
+        if len(_TTS_CACHE) > _TTS_CACHE_MAX:
+            _TTS_CACHE.popitem(last=False)
+    return status, audio_b64
+
+
+async def _tts_synthesize_mp3(text: str, lang: str = "en") -> Tuple[int, Optional[str]]:
     """
-    Generates MP3 using gTTS and returns base64 string.
+    Generates MP3 and returns base64 string.
+
+    Tries edge-tts first (one WebSocket, neural voices), then concurrent
+    translate_tts GETs on the shared async client, then plain gTTS in the
+    threadpool as the last resort.
     """
     try:
-        if not text or not text.strip():
-            return 200, None
-
-        mp3_fp = io.BytesIO()
-        tts = gTTS(text=text, lang=lang)
-        tts.write_to_fp(mp3_fp)
-        mp3_fp.seek(0)
+        try:
+            return 200, _b64.b64encode(await _edge_tts_mp3(text, lang)).decode("utf-8")
+        except Exception:
+            logger.warning("edge-tts unavailable, falling back to translate_tts")
 
-        audio_b64 = base64.b64encode(mp3_fp.read()).decode("utf-8")
-        return 200, audio_b64
+        try:
+            tokens = _split_tts_text(text.strip())
+            responses = await asyncio.gather(*(
+                _HTTPX.get(
+                    _TTS_URL,
+                    params={
+                        "ie": "UTF-8",
+                        "client": "tw-ob",
+                        "tl": lang,
+                        "q": token,
+                        "textlen": len(token),
+                        "idx": idx,
+                        "total": len(tokens),
+                    },
+                )
+                for idx, token in enumerate(tokens)
+            ))
+            for r in responses:
+                r.raise_for_status()
+            audio = b"".join(r.content for r in responses)
+        except Exception:
+            logger.warning("async TTS failed, falling back to gTTS")
+            audio = await run_in_threadpool(_gtts_sync_mp3, text, lang)
+
+        return 200, _b64.b64encode(audio).decode("utf-8")
 
     except Exception as e:
         logger.exception("gTTS failed")
@@ -220,41 +550,54 @@ async def tts_synthesize_mp3_gtts(text: str, lang: str = "en") -> Tuple[int, Opt
 # -------------------------
 # Endpoints
 # -------------------------
+class VoiceIn(BaseModel):
+    """Body for /voice and /voice/stream; "prompt"/"language" are accepted
+    aliases kept for older clients. Parsed natively by pydantic-core."""
+
+    text: str = ""
+    prompt: str = ""
+    lang: str = ""
+    language: str = ""
+
+
 @app.post("/voice")
-async def voice_endpoint(payload: dict):
+async def voice_endpoint(payload: VoiceIn):
     """
     Payload:
       {"text":"...", "lang":"Telugu"}
     Returns:
       {"reply":"...", "audio":"<base64_mp3>"} or {"reply":"__STOP__"}
     """
-    if not payload:
-        raise HTTPException(status_code=400, detail="Missing JSON body")
-
-    text = str(payload.get("text") or payload.get("prompt") or "").strip()
-    lang_label = str(payload.get("lang") or payload.get("language") or "English").strip()
-
+    # Cheapest checks first: empty and stop requests return before any other
+    # per-request work (speculative TTS, Gemini batching) is set up.
+    text = (payload.text or payload.prompt).strip()
     if text == "":
         return {"reply": "", "audio": None}
 
+    lang_label = (payload.lang or payload.language or "English").strip()
+
     # stop command
     if detect_stop_phrase(text, lang_label):
         return {"reply": "__STOP__", "audio": None}
 
+    # Synthesize the "busy" audio speculatively so the failure path adds no
+    # extra latency; cancelled if Gemini answers.
+    gtts_lang = GTTS_LANG_FROM_LABEL(lang_label)
+    fallback_task = asyncio.create_task(tts_synthesize_mp3_gtts(FALLBACK_REPLY, lang=gtts_lang))
+
     # Gemini reply
-    status, gen_text = await call_gemini_generate(text, lang_label=lang_label)
+    status, gen_text = await generate_reply(text, lang_label=lang_label)
 
     # If Gemini fails -> still return fallback reply + voice
     if status != 200 or not gen_text.strip():
-        fallback_reply = "Sorry, AI is busy right now. Please try again in 10 seconds."
-        gtts_lang = GTTS_LANG_FROM_LABEL(lang_label)
-        _, audio_b64 = await tts_synthesize_mp3_gtts(fallback_reply, lang=gtts_lang)
-        return {"reply": fallback_reply, "audio": audio_b64, "error": f"GEMINI_{status}", "detail": gen_text}
+        _, audio_b64 = await fallback_task
+        return {"reply": FALLBACK_REPLY, "audio": audio_b64, "error": f"GEMINI_{status}", "detail": gen_text}
+
+    fallback_task.cancel()
 
     short_reply = shorten_text_to_sentences(gen_text, max_sentences=2)
 
     # gTTS voice in same language
-    gtts_lang = GTTS_LANG_FROM_LABEL(lang_label)
     tts_status, audio_b64_or_err = await tts_synthesize_mp3_gtts(short_reply, lang=gtts_lang)
 
     if tts_status != 200:
@@ -264,16 +607,229 @@ async def voice_endpoint(payload: dict):
     return {"reply": short_reply, "audio": audio_b64_or_err}
 
 
+async def _stream_tts_chunks(text: str, lang: str):
+    """Yield MP3 bytes per TTS chunk so playback can start on the first one."""
+    yielded = False
+    try:
+        tokens = _split_tts_text(text.strip())
+        for idx, token in enumerate(tokens):
+            r = await _HTTPX.get(
+                _TTS_URL,
+                params={
+                    "ie": "UTF-8",
+                    "client": "tw-ob",
+                    "tl": lang,
+                    "q": token,
+                    "textlen": len(token),
+                    "idx": idx,
+                    "total": len(tokens),
+                },
+            )
+            r.raise_for_status()
+            yield r.content
+            yielded = True
+    except Exception:
+        logger.warning("streaming TTS failed, falling back to gTTS")
+        if not yielded:
+            yield await run_in_threadpool(_gtts_sync_mp3, text, lang)
+
+
+@app.post("/voice/stream")
+async def voice_stream_endpoint(payload: VoiceIn):
+    """
+    Like /voice, but the MP3 streams as audio/mpeg instead of arriving as
+    base64-in-JSON, so playback starts on the first chunk. The reply text
+    travels in the X-Reply header (URL-encoded).
+    """
+    text = (payload.text or payload.prompt).strip()
+    lang_label = (payload.lang or payload.language or "English").strip()
+
+    if text == "" or detect_stop_phrase(text, lang_label):
+        reply = "" if text == "" else "__STOP__"
+
+        async def _empty():
+            if False:
+                yield b""
+
+        return StreamingResponse(_empty(), media_type="audio/mpeg", headers={"X-Reply": quote(reply)})
+
+    status, gen_text = await generate_reply(text, lang_label=lang_label)
+    if status != 200 or not gen_text.strip():
+        reply = FALLBACK_REPLY
+    else:
+        reply = shorten_text_to_sentences(gen_text, max_sentences=2)
+
+    return StreamingResponse(
+        _stream_tts_chunks(reply, GTTS_LANG_FROM_LABEL(lang_label)),
+        media_type="audio/mpeg",
+        headers={"X-Reply": quote(reply)},
+    )
+
+
+# -------------------------
+# WebSocket voice transport
+# -------------------------
+_STT_LOCALES = {"en": "en-US", "hi": "hi-IN", "te": "te-IN", "ta": "ta-IN", "gu": "gu-IN"}
+
+
+def _transcribe_audio_sync(audio_bytes: bytes, lang_label: str) -> str:
+    """Blocking STT on recorded browser audio (webm/ogg) — run in a threadpool."""
+    import speech_recognition as sr
+    from pydub import AudioSegment
+
+    seg = AudioSegment.from_file(io.BytesIO(audio_bytes))
+    wav_buf = io.BytesIO()
+    seg.export(wav_buf, format="wav")
+    wav_buf.seek(0)
+
+    recognizer = sr.Recognizer()
+    with sr.AudioFile(wav_buf) as source:
+        audio = recognizer.record(source)
+
+    locale = _STT_LOCALES.get(LANG_CODE_FROM_LABEL(lang_label), "en-US")
+    return recognizer.recognize_google(audio, language=locale)
+
+
+async def _ws_answer(ws: WebSocket, text: str, lang_label: str):
+    """Generate reply + audio for one utterance and push deltas over the socket."""
+    if detect_stop_phrase(text, lang_label):
+        await ws.send_json({"type": "final", "text": "__STOP__"})
+        return
+
+    status, gen_text = await generate_reply(text, lang_label=lang_label)
+    if status != 200 or not gen_text.strip():
+        reply = FALLBACK_REPLY
+    else:
+        reply = shorten_text_to_sentences(gen_text, max_sentences=2)
+
+    await ws.send_json({"type": "final", "text": reply})
+
+    tts_status, audio_b64 = await tts_synthesize_mp3_gtts(reply, lang=GTTS_LANG_FROM_LABEL(lang_label))
+    if tts_status == 200 and audio_b64:
+        await ws.send_json({"type": "audio", "b64": audio_b64})
+
+
+@app.websocket("/ws")
+async def voice_ws(ws: WebSocket):
+    """Persistent voice channel: one TLS handshake per widget, not per utterance.
+
+    Client sends {"type":"config","lang":...} then either {"type":"text",...}
+    per utterance, or binary audio chunks followed by {"type":"end"}.
+    Server replies with {"type":"final"/"audio"/"error", ...} frames.
+    """
+    await ws.accept()
+    lang_label = "English"
+    audio_chunks = []
+
+    try:
+        while True:
+            msg = await ws.receive()
+
+            # Raw receive() *returns* the disconnect message instead of
+            # raising WebSocketDisconnect — receiving again after it is an error.
+            if msg.get("type") == "websocket.disconnect":
+                break
+
+            if msg.get("bytes") is not None:
+                audio_chunks.append(msg["bytes"])
+                continue
+
+            raw = msg.get("text")
+            if raw is None:
+                continue
+
+            try:
+                data = json.loads(raw)
+            except Exception:
+                continue
+
+            mtype = data.get("type")
+
+            if mtype == "config":
+                lang_label = str(data.get("lang") or "English").strip()
+
+            elif mtype == "text":
+                text = str(data.get("text") or "").strip()
+                if text:
+                    await _ws_answer(ws, text, lang_label)
+
+            elif mtype == "end":
+                chunks, audio_chunks = audio_chunks, []
+                if not chunks:
+                    continue
+                try:
+                    text = await run_in_threadpool(
+                        _transcribe_audio_sync, b"".join(chunks), lang_label
+                    )
+                except Exception as e:
+                    logger.warning(f"[ws] transcription failed: {e}")
+                    await ws.send_json({"type": "error", "text": "Could not understand the audio."})
+                    continue
+                await ws.send_json({"type": "partial", "text": text})
+                await _ws_answer(ws, text, lang_label)
+
+    except WebSocketDisconnect:
+        pass
+
+
+@app.post("/voice-audio")
+async def voice_audio(file: UploadFile = File(...), lang: str = Form("English")):
+    """
+    Audio-mode fallback used by the widget when SpeechRecognition and the
+    WebSocket are both unavailable: recorded audio in, reply MP3 out.
+
+    The upload is fed to the recognizer through BytesIO — no /tmp write —
+    and the blocking STT runs in the threadpool.
+    """
+    audio_bytes = await file.read()
+
+    try:
+        text = await run_in_threadpool(_transcribe_audio_sync, audio_bytes, lang)
+    except Exception as e:
+        logger.warning(f"voice-audio transcription failed: {e}")
+        raise HTTPException(status_code=422, detail="Could not understand the audio.")
+
+    if detect_stop_phrase(text, lang):
+        return Response(content=b"", media_type="audio/mpeg", headers={"X-Reply": quote("__STOP__")})
+
+    status, gen_text = await generate_reply(text, lang_label=lang)
+    if status != 200 or not gen_text.strip():
+        reply = FALLBACK_REPLY
+    else:
+        reply = shorten_text_to_sentences(gen_text, max_sentences=2)
+
+    tts_status, audio_b64 = await tts_synthesize_mp3_gtts(reply, lang=GTTS_LANG_FROM_LABEL(lang))
+    if tts_status != 200 or not audio_b64:
+        raise HTTPException(status_code=502, detail="TTS failed")
+
+    return Response(
+        content=base64.b64decode(audio_b64),
+        media_type="audio/mpeg",
+        headers={"X-Reply": quote(reply)},
+    )
+
+
+# Load balancers poll /health every few seconds — serialize the body once.
+_HEALTH_BYTES = orjson.dumps({
+    "status": "ok",
+    "model": GEMINI_MODEL,
+    "fallback_model": FALLBACK_MODEL,
+})
+
+
 @app.get("/health")
 async def health():
-    return {
-        "status": "ok",
-        "model": GEMINI_MODEL,
-        "fallback_model": FALLBACK_MODEL
-    }
+    return Response(
+        content=_HEALTH_BYTES,
+        media_type="application/json",
+        headers={"Cache-Control": "public, max-age=5"},
+    )
 # -------------------------
 # Vision Endpoint (NEW)
 # -------------------------
+_VISION_MAX_BYTES = 8 * 1024 * 1024
+
+
 @app.post("/vision")
 async def vision_endpoint(
     image: UploadFile = File(...),
@@ -285,15 +841,26 @@ async def vision_endpoint(
     Receives image + question from Streamlit.
     """
 
-    try:
-        img_bytes = await image.read()
+    # Stream the upload into a bounded buffer instead of image.read(): the
+    # size cap rejects oversized uploads before they are fully buffered.
+    buf = io.BytesIO()
+    total = 0
+    while chunk := await image.read(64 * 1024):
+        total += len(chunk)
+        if total > _VISION_MAX_BYTES:
+            raise HTTPException(status_code=413, detail="Image too large (max 8 MB)")
+        buf.write(chunk)
+    img_bytes = buf.getvalue()
 
+    try:
         # import your LangGraph vision logic
         from agent_graph import graph
 
-        result = graph.invoke({
+        # graph.invoke does synchronous Gemini I/O — keep it off the event loop
+        result = await run_in_threadpool(graph.invoke, {
             "messages": [{"role": "user", "content": question}],
-            "image_bytes": img_bytes
+            "image_bytes": img_bytes,
+            "image_mime": image.content_type or "image/jpeg"
         })
 
         reply = result.get("reply", "").strip()
@@ -306,3 +873,18 @@ async def vision_endpoint(
     except Exception as e:
         logger.exception("Vision endpoint failed")
         return {"reply": f"Vision error: {e}"}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # uvloop + httptools roughly double throughput over the default
+    # asyncio + h11 stack for I/O-bound endpoints like these.
+    uvicorn.run(
+        "voice_proxy:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "8765")),
+        workers=int(os.getenv("WEB_CONCURRENCY", str(2 * (os.cpu_count() or 1) + 1))),
+        loop="uvloop",
+        http="httptools",
+    )